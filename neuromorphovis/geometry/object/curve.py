@@ -69,22 +69,40 @@ def draw_cyclic_curve_from_points(curve_name,
 
 
 def draw_polyline_curve(name, vertices, curve_type='POLY',
-                        select=True, active=True):
+                        select=True, active=True, template=None, link=True):
     """
     Draw polyline as Curve geometry.
+
+    The object origin is placed at the center of mass of the vertices.
+
+    :param template:
+        Curve data whose settings (bevel, materials, ...) are copied
+        to the new curve.
+    :param link:
+        Link the curve object to the scene. When drawing many curves, pass
+        False and link them afterwards to avoid a scene update per curve.
     """
     # Container for curve
-    curvedata = bpy.data.curves.new(name='curve_'+name, type='CURVE')
+    if template is None:
+        curvedata = bpy.data.curves.new(name='curve_'+name, type='CURVE')
+    else:
+        curvedata = template.copy()
+        curvedata.name = 'curve_'+name
     curvedata.dimensions = '3D'
     if curve_type == 'NURBS':
         curvedata.resolution_u = 2 
 
-    # Create the curve
+    # Homogeneous coordinates (x, y, z, w) as expected by spline points,
+    # relative to the object origin
+    coords = np.ones((len(vertices), 4), dtype=np.float32)
+    coords[:, :3] = vertices
+    center = coords[:, :3].mean(axis=0)
+    coords[:, :3] -= center
+
+    # Create the curve and set all points in one call
     polyline = curvedata.splines.new(curve_type)
     polyline.points.add(len(vertices)-1)
-    for i, coord in enumerate(vertices):
-        x,y,z = coord
-        polyline.points[i].co = (x, y, z, 1)
+    polyline.points.foreach_set('co', coords.ravel())
 
     if curve_type == 'NURBS':
         polyline.order_u = len(polyline.points)-1
@@ -92,13 +110,15 @@ def draw_polyline_curve(name, vertices, curve_type='POLY',
 
     # create Object
     curve_obj = bpy.data.objects.new(name, curvedata)
+    curve_obj.location = center.tolist()
 
     # attach to scene and validate context
-    bpy.context.scene.objects.link(curve_obj)
-    bpy.context.scene.objects.active = curve_obj
-    bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS') # ORIGIN_CENTER_OF_MASS
+    if link:
+        bpy.context.scene.objects.link(curve_obj)
+        if active:
+            bpy.context.scene.objects.active = curve_obj
+        curve_obj.select = select # add to selection
 
-    curve_obj.select = select # add to selection
     return curve_obj
 
 
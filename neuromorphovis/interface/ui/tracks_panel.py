@@ -8,7 +8,10 @@ Panel for importing streamlines generated using diffusion tractography.
 
 # Python imports
 import os
+import math
 import pickle
+import itertools
+import concurrent.futures
 
 # Blender imports
 import bpy
@@ -18,11 +21,14 @@ import mathutils
 # External imports
 import numpy as np
 import nibabel as nib
+try:
+    import numba
+except ImportError:
+    numba = None
 
 # Internal imports
 import neuromorphovis as nmv
 import neuromorphovis.scene
-import neuromorphovis.interface as nmvif
 
 from neuromorphovis.interface.ui.ui_data import NMV_PROP, NMV_TYPE
 from neuromorphovis.geometry.object import curve as nmv_curve
@@ -39,8 +45,40 @@ STREAMLINE_MATERIAL_PREFIX = 'streamline_mat_'
 GROUPNAME_HELPER_GEOMETRY = 'Helper Geometry'
 GROUPNAME_ROI_VOLUMES = 'ROI Volumes'
 
-# Groups of imported streamlines
-_tck_groups = {}
+# Upper limit on the number of streamlines loaded from a single file.
+MAX_LOAD_STREAMLINES = 10000
+
+# Streamlines with fewer points than this have their length computed using
+# scalar arithmetic, since NumPy call overhead dominates for tiny arrays.
+SHORT_STREAMLINE_MAX_POINTS = 32
+
+# Number of segments per block when accumulating streamline length,
+# so long streamlines can be accepted before all segments are visited.
+TCK_LEN_BLOCK_SIZE = 256
+
+# Number of streamlines per block when selecting streamlines from a TCK
+# file, so reading can stop once enough streamlines are selected.
+TCK_SELECT_BLOCK_SIZE = 4096
+
+# Number of blocks evaluated concurrently when numba is not available.
+# NumPy releases the GIL in its inner loops, so threads run in parallel.
+TCK_SELECT_NUM_THREADS = os.cpu_count() or 1
+
+# NumPy data types for the 'datatype' field of a TCK header
+_TCK_DTYPES = {
+    'Float32LE': '<f4',
+    'Float32BE': '>f4',
+    'Float64LE': '<f8',
+    'Float64BE': '>f8',
+}
+
+# Names of all streamline objects in bpy.data.objects, or None if the index
+# must be rebuilt. Only names are stored since objects can be removed.
+_streamline_names = None
+
+# Bevel profile objects by rounded radius. Cleared when loading a file or
+# undoing, since these replace all Blender data and invalidate references.
+_bevel_cache = {}
 
 # Materials
 _STREAMLINE_MATERIAL_DEFS = {
@@ -59,6 +97,12 @@ _STREAMLINE_MATERIAL_DEFS = {
     }
 }
 
+# Material definitions with unassigned properties taken from DEFAULT
+_STREAMLINE_MATERIAL_PROPS = {
+    state: dict(_STREAMLINE_MATERIAL_DEFS['DEFAULT'], **mat_def)
+        for state, mat_def in _STREAMLINE_MATERIAL_DEFS.items()
+}
+
 # Custom Blender properties used by this module
 _PROP_AX_EXPORT = NMV_PROP.INCLUDE_EXPORT
 _PROP_OBJECT_TYPE = NMV_PROP.OBJECT_TYPE
@@ -72,19 +116,281 @@ def get_streamlines(bpy_objects=None, selector=None):
     Get all streamlines in the object collection
 
     :param  bpy_objects:
-        bpy_collection, e.g. context.scene.objects or bpy.data.objects
+        bpy_collection, e.g. context.scene.objects or bpy.data.objects.
+        By default, the streamlines in bpy.data.objects are taken from
+        the index of streamline objects.
     """
     if bpy_objects is None:
-        bpy_objects = bpy.data.objects
+        bpy_objects = get_indexed_streamlines()
+    prop_type, tck_type = _PROP_OBJECT_TYPE, NMV_TYPE.STREAMLINE
     if selector is None:
-        selector = lambda crv: True
+        return [o for o in bpy_objects if o.get(prop_type, None) == tck_type]
     elif selector == 'INCLUDE_EXPORT':
-        selector = lambda crv: crv.get(_PROP_AX_EXPORT, False)
+        prop_export = _PROP_AX_EXPORT
+        return [o for o in bpy_objects if (
+                    (o.get(prop_type, None) == tck_type)
+                    and o.get(prop_export, False))]
     return [o for o in bpy_objects if (
-                (o.get(_PROP_OBJECT_TYPE, None) == 'streamline')
+                (o.get(prop_type, None) == tck_type)
                 and (selector(o)))]
 
 
+def get_indexed_streamlines():
+    """
+    Get all streamline objects in bpy.data.objects using the index of
+    streamline objects.
+
+    The index is rebuilt by scanning bpy.data.objects when it was
+    invalidated, or when one of its objects was removed or renamed.
+    """
+    global _streamline_names
+    all_objects = bpy.data.objects
+    if _streamline_names is None or any(
+            (name not in all_objects) for name in _streamline_names):
+        prop_type, tck_type = _PROP_OBJECT_TYPE, NMV_TYPE.STREAMLINE
+        _streamline_names = [o.name for o in all_objects
+                                if o.get(prop_type, None) == tck_type]
+    return [all_objects[name] for name in _streamline_names]
+
+
+def invalidate_streamline_index():
+    """
+    Rebuild the index of streamline objects on next use.
+
+    Must be called after marking objects as streamlines.
+    """
+    global _streamline_names
+    _streamline_names = None
+
+
+@bpy.app.handlers.persistent
+def _update_streamline_index(scene):
+    """
+    Invalidate the index of streamline objects when objects were
+    added, removed or changed.
+    """
+    if bpy.data.objects.is_updated:
+        invalidate_streamline_index()
+
+
+@bpy.app.handlers.persistent
+def _reset_streamline_index(scene):
+    """
+    Invalidate the index of streamline objects after loading a file.
+    """
+    invalidate_streamline_index()
+
+
+@bpy.app.handlers.persistent
+def _clear_bevel_cache(scene):
+    """
+    Forget cached bevel profile objects after loading a file or undo/redo.
+    """
+    _bevel_cache.clear()
+
+
+def _get_or_create_group(name):
+    """
+    Get the Blender group with given name, creating it if it doesn't exist.
+    """
+    group = bpy.data.groups.get(name, None)
+    if group is None:
+        group = bpy.data.groups.new(name)
+    return group
+
+
+def _tck_len_short(streamline, min_length=float('inf')):
+    """
+    Get the length of a short streamline using scalar arithmetic.
+
+    :param  streamline:
+        (N x 3) array or list of coordinates
+    :param  min_length:
+        Stop accumulating once the length reaches this value.
+    """
+    pts = np.asarray(streamline).tolist()
+    if len(pts) < 2:
+        return 0.0
+    tck_len = 0.0
+    x0, y0, z0 = pts[0]
+    for x1, y1, z1 in pts[1:]:
+        dx, dy, dz = x1 - x0, y1 - y0, z1 - z0
+        tck_len += math.sqrt(dx*dx + dy*dy + dz*dz)
+        if tck_len >= min_length:
+            break
+        x0, y0, z0 = x1, y1, z1
+    return tck_len
+
+
+def _tck_len_long(streamline, diff_buf, sq_buf, min_length=float('inf')):
+    """
+    Get the length of a streamline using preallocated scratch buffers.
+
+    Segments are processed in blocks the size of the scratch buffers,
+    so accumulation stops early once the length reaches min_length.
+
+    :param  diff_buf:
+        (M x 3) float32 array
+    :param  sq_buf:
+        (M,) float32 array
+    :param  min_length:
+        Stop accumulating once the length reaches this value.
+    """
+    num_seg = len(streamline) - 1
+    block_size = len(sq_buf)
+    tck_len = 0.0
+    for start in range(0, num_seg, block_size):
+        stop = min(start + block_size, num_seg)
+        seg_vecs = diff_buf[:stop-start]
+        seg_lens = sq_buf[:stop-start]
+        np.subtract(streamline[start+1:stop+1], streamline[start:stop],
+                    out=seg_vecs)
+        np.einsum('ij,ij->i', seg_vecs, seg_vecs, out=seg_lens)
+        np.sqrt(seg_lens, out=seg_lens)
+        tck_len += float(seg_lens.sum())
+        if tck_len >= min_length:
+            break
+    return tck_len
+
+
+def _fast_tck_parse(file_path):
+    """
+    Parse a MRtrix .tck file using a memory map of its body.
+
+    Points in a TCK file are stored as consecutive (x, y, z) triplets in
+    RAS+ world coordinates. Each streamline is terminated by a NaN triplet
+    and the file is terminated by an Inf triplet.
+
+    :return:
+        tuple (data, offsets) where data is the (M x 3) memory-mapped point
+        array including delimiters, and streamline i is
+        data[offsets[i]+1:offsets[i+1]].
+    """
+    header = {}
+    with open(file_path, 'rb') as file:
+        if file.readline().strip() != b'mrtrix tracks':
+            raise ValueError('Not a TCK file: {}'.format(file_path))
+        for line in file:
+            line = line.decode('latin1').strip()
+            if line == 'END':
+                break
+            key, _, value = line.partition(':')
+            header[key.strip()] = value.strip()
+
+    header_size = int(header['file'].split()[1])
+    dtype = _TCK_DTYPES[header['datatype']]
+    data = np.memmap(file_path, dtype=dtype, mode='r', offset=header_size)
+    data = data[:(len(data) // 3) * 3].reshape((-1, 3))
+
+    # Crop at end-of-file marker and find streamline delimiters
+    eof = np.where(np.isinf(data[:, 0]))[0]
+    if len(eof) > 0:
+        data = data[:eof[0]]
+    delimiters = np.where(np.isnan(data[:, 0]))[0]
+    offsets = np.concatenate(([-1], delimiters))
+
+    return data, offsets
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True)
+    def _tck_length_mask(pts, starts, stops, min_length):
+        """
+        Get mask of streamlines with a length of at least min_length.
+
+        Streamline i is pts[starts[i]:stops[i]].
+        """
+        mask = np.empty(len(starts), dtype=np.bool_)
+        for i in numba.prange(len(starts)):
+            tck_len = 0.0
+            for j in range(starts[i], stops[i] - 1):
+                dx = pts[j+1, 0] - pts[j, 0]
+                dy = pts[j+1, 1] - pts[j, 1]
+                dz = pts[j+1, 2] - pts[j, 2]
+                tck_len += math.sqrt(dx*dx + dy*dy + dz*dz)
+                if tck_len >= min_length:
+                    break
+            mask[i] = tck_len >= min_length
+        return mask
+else:
+    def _tck_length_mask(pts, starts, stops, min_length):
+        """
+        Get mask of streamlines with a length of at least min_length.
+
+        Streamline i is pts[starts[i]:stops[i]].
+        """
+        seg_vecs = pts[1:] - pts[:-1]
+        seg_lens = np.einsum('ij,ij->i', seg_vecs, seg_vecs)
+        del seg_vecs
+        np.sqrt(seg_lens, out=seg_lens)
+        np.nan_to_num(seg_lens, copy=False) # segments between streamlines
+
+        # Length of path from first point to each point
+        cum_lens = np.zeros(len(pts) + 1, dtype=np.float64)
+        np.cumsum(seg_lens, dtype=np.float64, out=cum_lens[1:len(pts)])
+
+        tck_lens = cum_lens[np.maximum(stops - 1, starts)] - cum_lens[starts]
+        return tck_lens >= min_length
+
+
+def _tck_block_mask(data, block, min_length):
+    """
+    Select streamlines from one block of a .tck file.
+
+    :param  block:
+        Slice of the offsets returned by _fast_tck_parse()
+
+    :return:
+        tuple (pts, starts, stops, accepted) where streamline i of the block
+        is pts[starts[i]:stops[i]] and accepted are the selected indices.
+    """
+    base = block[0] + 1
+    pts = np.asarray(data[base:block[-1]], dtype=np.float32)
+    starts = block[:-1] + 1 - base
+    stops = block[1:] - base
+
+    if min_length > 0:
+        accepted = np.flatnonzero(
+            _tck_length_mask(pts, starts, stops, min_length))
+    else:
+        accepted = np.arange(len(starts))
+
+    return pts, starts, stops, accepted
+
+
+def _select_fast_tck(data, offsets, max_num, min_length):
+    """
+    Select streamlines from a .tck file parsed by _fast_tck_parse().
+
+    Streamlines are processed in blocks so that only the part of the
+    file needed to select max_num streamlines is read. Blocks are only
+    evaluated in parallel if the remaining number of streamlines to select
+    spans multiple blocks.
+
+    :return:
+        list of (N x 3) float32 arrays
+    """
+    blocks = (offsets[first:first + TCK_SELECT_BLOCK_SIZE + 1] for first in
+                range(0, len(offsets) - 1, TCK_SELECT_BLOCK_SIZE))
+    num_threads = 1 if numba is not None else TCK_SELECT_NUM_THREADS
+
+    selected = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+        while len(selected) < max_num:
+            num_blocks = min(num_threads, math.ceil(
+                            (max_num - len(selected)) / TCK_SELECT_BLOCK_SIZE))
+            batch = list(itertools.islice(blocks, num_blocks))
+            if len(batch) == 0:
+                break
+            results = executor.map(
+                lambda block: _tck_block_mask(data, block, min_length), batch)
+            for pts, starts, stops, accepted in results:
+                for i in accepted[:int(max_num) - len(selected)]:
+                    selected.append(pts[starts[i]:stops[i]])
+
+    return selected
+
+
 def load_streamlines(file_path, label=None, max_num=1e12, min_length=0.0,
                      encoding='ASCII'):
     """
@@ -92,6 +398,10 @@ def load_streamlines(file_path, label=None, max_num=1e12, min_length=0.0,
 
     :param  encoding"
         Use 'latin1' for pickle files containing numpy data.
+
+    :return:
+        tuple (data, offsets) where data is an (M x 3) float32 array of
+        all points and streamline i is data[offsets[i]:offsets[i+1]].
     """
     # Load streamline as iterable of coordinate lists/arrays
     if file_path.endswith('.pkl'):
@@ -104,57 +414,180 @@ def load_streamlines(file_path, label=None, max_num=1e12, min_length=0.0,
                 streamlines = f_contents
         else:
             streamlines = f_contents[label]
+    elif file_path.endswith('.npz'):
+        # Concatenated streamlines written by ExportStreamlines
+        with np.load(file_path) as npz_contents:
+            data = npz_contents['data']
+            offsets = npz_contents['offsets']
+            names = npz_contents['names']
+        streamlines = (data[offsets[i]:offsets[i+1]] for i in range(len(names))
+                        if label is None or label == '' or names[i] == label)
+    elif file_path.endswith('.tck'):
+        # Read the file body in bulk rather than using nibabel's
+        # buffered per-streamline reader. TCK coordinates are already
+        # in RAS+ world coordinates, so no affine needs to be applied.
+        data, offsets = _fast_tck_parse(file_path)
+        return concatenate_streamlines(
+                    _select_fast_tck(data, offsets, max_num, min_length))
     else:
-        # Assume tractography file
+        # Assume tractography file. nibabel's loaders already transform the
+        # streamlines to the RAS+ world coordinate system (to_world()), so
+        # the tractogram's affine_to_rasmm is the identity here.
         tck_file = nib.streamlines.load(file_path, lazy_load=True)
-
-        # Make sure tracts are defined in RAS+ world coordinate system
-        tractogram = tck_file.tractogram.to_world(lazy=True)
-
-        # Manual transformation to RAS+ world coordinate system
-        # vox2ras = tck_file.tractogram.affine_to_rasmm
-        # tck_ras_coords = nib.affines.apply_affine(vox2ras, streamline)
-        streamlines = tractogram.streamlines
-
-    # Select streamlines from file
-    streamlines_filtered = []
+        streamlines = tck_file.tractogram.streamlines
+
+    # Select streamlines from file, preallocating the list if the count is known
+    try:
+        num_max = int(min(max_num, len(streamlines)))
+        streamlines_filtered = [None] * num_max
+    except TypeError: # generator without length
+        num_max = max_num
+        streamlines_filtered = []
+    num_filtered = 0
+    diff_buf = np.empty((TCK_LEN_BLOCK_SIZE, 3), dtype=np.float32)
+    sq_buf = np.empty(TCK_LEN_BLOCK_SIZE, dtype=np.float32)
     for i, streamline in enumerate(streamlines): # lazy-loading generator
         # streamline is (N x 3) matrix
-        if len(streamlines_filtered) >= max_num:
+        if num_filtered >= num_max:
             break
+        # single precision is sufficient for coordinates in mm
+        streamline = np.asarray(streamline, dtype=np.float32)
         # check length
         if min_length > 0:
-            tck_len = np.sum(np.linalg.norm(np.diff(streamline, axis=0), axis=1))
+            if len(streamline) < SHORT_STREAMLINE_MAX_POINTS:
+                tck_len = _tck_len_short(streamline, min_length)
+            else:
+                tck_len = _tck_len_long(streamline, diff_buf, sq_buf, min_length)
         else:
             tck_len = 1.0
         if tck_len >= min_length:
-            streamlines_filtered.append(streamline)
+            if num_filtered < len(streamlines_filtered):
+                streamlines_filtered[num_filtered] = streamline
+            else:
+                streamlines_filtered.append(streamline)
+            num_filtered += 1
+    del streamlines_filtered[num_filtered:]
+
+    return concatenate_streamlines(streamlines_filtered)
 
-    return streamlines_filtered
+
+def concatenate_streamlines(streamlines):
+    """
+    Concatenate streamlines into a single point buffer.
+
+    :param  streamlines:
+        list of (N x 3) arrays
+
+    :return:
+        tuple (data, offsets) where streamline i is
+        data[offsets[i]:offsets[i+1]].
+    """
+    num_pts = np.fromiter((len(tck) for tck in streamlines), dtype=np.intp,
+                          count=len(streamlines))
+    offsets = np.zeros(len(streamlines) + 1, dtype=np.intp)
+    np.cumsum(num_pts, out=offsets[1:])
+
+    data = np.empty((offsets[-1], 3), dtype=np.float32)
+    for i, streamline in enumerate(streamlines):
+        data[offsets[i]:offsets[i+1]] = streamline
+
+    return data, offsets
 
 
 def get_curve_point_coordinates(curve_object, coord_type=None):
     """
     Get vertex coordinates of Blender curve representing a streamline.
+
+    :return:
+        (N x 3) array of world coordinates, or list of coord_type(point)
+        if coord_type is given.
     """
     if curve_object.type != 'CURVE':
         raise ValueError(curve_object.type)
     
     spl = curve_object.data.splines[0]
     if spl.type in ('NURBS', 'BEZIER'):
-        coords = nmv_curve.spline_to_polyline(curve_object,
-                            spacing=50.0, raw_coordinates=True)
+        coords = np.array(nmv_curve.spline_to_polyline(curve_object,
+                            spacing=50.0, raw_coordinates=True), dtype=np.float32)
     else: # type = 'POLY'
         num_pts = len(spl.points)
-        coords = [(curve_object.matrix_world * spl.points[i].co)[0:3] for i in range(num_pts)]
+        co_buf = np.empty(num_pts * 4, dtype=np.float32)
+        spl.points.foreach_get('co', co_buf)
+        xform = np.array(curve_object.matrix_world, dtype=np.float32)
+        coords = co_buf.reshape((num_pts, 4)).dot(xform.T)[:, :3]
 
     # Return as requested data type
     if coord_type:
-        return [coord_type(pt) for pt in coords]
+        return [coord_type(pt) for pt in coords.tolist()]
     else:
         return coords
 
 
+def concatenate_curve_coordinates(curve_objects):
+    """
+    Get world coordinates of curves as a single point buffer.
+
+    Coordinates of polylines are copied into the buffer one curve at a
+    time. Spline-type curves must be sampled to count their points, so
+    their sampled coordinates are kept until they are copied.
+
+    :return:
+        tuple (data, offsets) where the points of curve_objects[i] are
+        data[offsets[i]:offsets[i+1]].
+    """
+    # Polylines are read as-is, spline-type curves must be sampled first
+    sampled = {}
+    num_pts = np.empty(len(curve_objects), dtype=np.intp)
+    for i, curve_object in enumerate(curve_objects):
+        spl = curve_object.data.splines[0]
+        if spl.type == 'POLY':
+            num_pts[i] = len(spl.points)
+        else:
+            sampled[i] = get_curve_point_coordinates(curve_object)
+            num_pts[i] = len(sampled[i])
+
+    offsets = np.zeros(len(curve_objects) + 1, dtype=np.intp)
+    np.cumsum(num_pts, out=offsets[1:])
+
+    data = np.empty((offsets[-1], 3), dtype=np.float32)
+    for i, curve_object in enumerate(curve_objects):
+        coords = sampled.pop(i, None)
+        if coords is None:
+            coords = get_curve_point_coordinates(curve_object)
+        data[offsets[i]:offsets[i+1]] = coords
+
+    return data, offsets
+
+
+def _resample_polyline(pts, spacing):
+    """
+    Resample a polyline at regular arclength intervals.
+
+    :param  pts:
+        (N x 3) array of polyline vertices
+    :param  spacing:
+        distance between consecutive samples along the polyline
+    :return:
+        (M x 3) float32 array of samples, including both end points.
+    """
+    pts = np.asarray(pts, dtype=np.float64)
+    seg = np.diff(pts, axis=0)
+    seg_len = np.sqrt(np.einsum('ij,ij->i', seg, seg))
+    cum_len = np.concatenate(([0.0], np.cumsum(seg_len)))
+    total_len = cum_len[-1]
+    if spacing >= total_len:
+        raise ValueError('Spacing must be smaller than length of curve.')
+
+    targets = np.arange(0.0, total_len, spacing)
+    if targets[-1] < total_len:
+        targets = np.append(targets, total_len)
+
+    samples = np.empty((len(targets), 3), dtype=np.float32)
+    for k in range(3):
+        samples[:, k] = np.interp(targets, cum_len, pts[:, k])
+    return samples
+
+
 def get_streamline_material(state='DEFAULT'):
     """
     Get skeleton materials, while only creating them once.
@@ -170,8 +603,7 @@ def get_streamline_material(state='DEFAULT'):
         mat = bpy.data.materials.new(mat_name)
 
         # Set material properties
-        for prop_name, default_val in _STREAMLINE_MATERIAL_DEFS['DEFAULT'].items():
-            value = _STREAMLINE_MATERIAL_DEFS[state].get(prop_name, default_val)
+        for prop_name, value in _STREAMLINE_MATERIAL_PROPS[state].items():
             setattr(mat, prop_name, value)
 
     return mat
@@ -181,29 +613,49 @@ def get_streamline_bevel_profile(radius=1.0):
     """
     Create a 'bevel object' for a streamline curve. This is a native Blender
     curve property that determines the extrusion profile.
+
+    The radius is rounded to 6 significant digits so that radii differing
+    only by floating point error share the same profile object.
     """
+    radius = float('%.6g' % radius)
+    bev_obj = _bevel_cache.get(radius, None)
+    if bev_obj is not None:
+        try:
+            if bev_obj.users > 0:
+                return bev_obj
+        except ReferenceError: # removed from bpy.data
+            pass
+        del _bevel_cache[radius]
+
     bev_name = 'streamline_bevel_profile_radius-{}'.format(radius)
     bev_obj = bpy.data.objects.get(bev_name, None)
     if bev_obj is None:
-        bpy.ops.object.select_all(action='DESELECT')
-
-        bpy.ops.curve.primitive_bezier_circle_add(location=[0., 0., 0.])
+        # Same circle as bpy.ops.curve.primitive_bezier_circle_add(), but
+        # created through bpy.data to avoid operator and context overhead
+        bev_data = bpy.data.curves.new(bev_name, type='CURVE')
+        bev_data.dimensions = '2D'
+        spl = bev_data.splines.new('BEZIER')
+        spl.bezier_points.add(3)
+        spl.bezier_points.foreach_set('co', [-1.0, 0.0, 0.0,
+                                             0.0, 1.0, 0.0,
+                                             1.0, 0.0, 0.0,
+                                             0.0, -1.0, 0.0])
+        for bezier_point in spl.bezier_points:
+            bezier_point.handle_left_type = 'AUTO'
+            bezier_point.handle_right_type = 'AUTO'
+        spl.use_cyclic_u = True
 
         # Set its geometrical properties
         num_verts = 16
-        bpy.context.object.data.resolution_u = num_verts / 4
-        bev_obj = bpy.context.scene.objects.active
-        bev_obj.scale[0] = radius
-        bev_obj.scale[1] = radius
-        bev_obj.scale[2] = radius
+        bev_data.resolution_u = num_verts // 4
+        bev_obj = bpy.data.objects.new(bev_name, bev_data)
+        bpy.context.scene.objects.link(bev_obj)
+        bev_obj.scale = (radius, radius, radius)
 
         # Make it findable
-        bev_obj.name = bev_name
-        group = bpy.data.groups.get(GROUPNAME_HELPER_GEOMETRY, None)
-        if group is None:
-            group = bpy.data.groups.new(GROUPNAME_HELPER_GEOMETRY)
-        group.objects.link(bev_obj)
+        _get_or_create_group(GROUPNAME_HELPER_GEOMETRY).objects.link(bev_obj)
 
+    _bevel_cache[radius] = bev_obj
     return bev_obj
 
 
@@ -212,8 +664,15 @@ def set_streamline_appearance(curve_obj, material=None, solid=True,
     """
     Set the appearance of any Blender curve.
     """
-    line_data = curve_obj.data
+    set_curve_data_appearance(curve_obj.data, material=material, solid=solid,
+                              bevel_object=bevel_object, caps=caps)
+
 
+def set_curve_data_appearance(line_data, material=None, solid=True,
+                              bevel_object=None, caps=True):
+    """
+    Set the appearance of Blender curve data.
+    """
     # The line is drawn in 3D
     line_data.dimensions = '3D'
     line_data.fill_mode = 'FULL'
@@ -241,6 +700,16 @@ def set_streamline_appearance(curve_obj, material=None, solid=True,
 
 
 
+def copy_curve_appearance(src_data, dst_data):
+    """
+    Copy the appearance of Blender curve data to other curve data.
+    """
+    dst_data.bevel_object = src_data.bevel_object
+    dst_data.use_fill_caps = src_data.use_fill_caps
+    if len(src_data.materials) > 0:
+        dst_data.materials.append(src_data.materials[0])
+
+
 ################################################################################
 # UI elements
 ################################################################################
@@ -258,62 +727,6 @@ class StreamlinesPanel(bpy.types.Panel):
     bl_category = 'NeuroMorphoVis'
     bl_options = {'DEFAULT_CLOSED'}
 
-    # --------------------------------------------------------------------------
-    # Properties for UI state
-
-    # Streamlines file
-    debug_tck_file = '/home/luye/Documents/mri_data/Waxholm_rat_brain_atlas/WHS_DTI_v1_ALS/S56280_track_filter-ROI-STN.tck'
-    default_tck_file = debug_tck_file if DEBUG else 'Select File'
-
-    bpy.types.Scene.StreamlinesFile = StringProperty(
-        name="Streamlines File",
-        description="Select streamlines file",
-        default=default_tck_file, maxlen=2048,  subtype='FILE_PATH')
-
-    bpy.types.Scene.StreamlinesLabel = StringProperty(
-        name="Label",
-        description="Enter label for streamlines in file (supported by pickle files)",
-        default='')
-
-    # ISSUE when loading numpy data saved using Python 2.x -> encoding must be 'latin1'
-    bpy.types.Scene.StreamlinesEncoding = StringProperty(
-        name="Encoding",
-        description="Encoding of streamlines if using Python pickle file.",
-        default='latin1')
-
-
-    bpy.types.Scene.MaxLoadStreamlines = IntProperty(
-        name="Max Streamlines",
-        description="Maximum number of loaded streamlines",
-        default=100, min=1, max=10000)
-
-    bpy.types.Scene.MinStreamlineLength = FloatProperty(
-        name="Min Length",
-        description="Minimum streamline length (mm)",
-        default=1.0, min=1.0, max=1e6)
-
-    bpy.types.Scene.StreamlineUnitScale = FloatProperty(
-        name="Scale",
-        description="Streamline scale relative to microns (units/um)",
-        default=1e3, min=1e-12, max=1e12)
-
-    bpy.types.Scene.RoiName = StringProperty(
-        name="ROI Name",
-        description="Name for selected ROI volume",
-        default='ROI-1')
-
-
-    bpy.types.Scene.SampleSpacing = FloatProperty(
-        name="Spacing",
-        description="Spacing between streamline samples.",
-        default=100.0)
-
-    bpy.types.Scene.SubsampleFactor = IntProperty(
-        name="Subsample factor",
-        description="Subsample factor",
-        default=1)
-
-
     # --------------------------------------------------------------------------
     # Panel overriden methods
 
@@ -417,7 +830,7 @@ class ImportStreamlines(bpy.types.Operator):
             'FINISHED'
         """
 
-        # Load the streamlines as N x 3 arrays
+        # Load the streamlines as concatenated N x 3 arrays
         streamlines = load_streamlines(context.scene.StreamlinesFile,
                         label=context.scene.StreamlinesLabel,
                         max_num=context.scene.MaxLoadStreamlines,
@@ -426,39 +839,52 @@ class ImportStreamlines(bpy.types.Operator):
         if streamlines is None:
             self.report({'ERROR'}, 'Invalid streamlines file.')
             return {'FINISHED'}
+        tck_data, tck_offsets = streamlines
+        num_tck = len(tck_offsets) - 1
 
         # convert to Blender polyline curves
         fname_base, ext = os.path.splitext(os.path.split(context.scene.StreamlinesFile)[1])
 
         # Create group
         group_name = "Axons ({})".format(fname_base)
-        tck_group = bpy.data.groups.get(group_name, None)
-        if tck_group is None:
-            tck_group = bpy.data.groups.new(group_name)
+        tck_group = _get_or_create_group(group_name)
 
         # Material for streamlines
         tck_mat = get_streamline_material(state='DEFAULT')
-        tck_scale = context.scene.StreamlineUnitScale
-        bev_obj = get_streamline_bevel_profile(radius=tck_scale*1e-3)
-
-        # Create curves
-        for tck_coords in streamlines:
-            tck_coords = np.asarray(tck_coords, dtype=float)
-            tck_name = 'tck'
-            if context.scene.StreamlinesLabel != '':
-                tck_name += '_' + context.scene.StreamlinesLabel
-            tck_name +=  '_' + fname_base # copies are numbered by Blender
-
-            # Scale units
-            coords_micron = tck_coords * tck_scale
+        tck_scale = np.float32(context.scene.StreamlineUnitScale)
+        bev_obj = get_streamline_bevel_profile(
+                    radius=context.scene.StreamlineUnitScale*1e-3)
+
+        # Appearance shared by all streamlines is set once on a template,
+        # whose settings are copied for each new curve
+        tck_template = bpy.data.curves.new(name='streamline_template', type='CURVE')
+        set_curve_data_appearance(tck_template, material=tck_mat, solid=True,
+                                  caps=True, bevel_object=bev_obj)
+
+        # Scale units
+        tck_data *= tck_scale
+
+        # Name curves with explicit numbers, so Blender doesn't need to
+        # search for a free name suffix for each new curve
+        tck_name_base = 'tck'
+        if context.scene.StreamlinesLabel != '':
+            tck_name_base += '_' + context.scene.StreamlinesLabel
+        tck_name_base +=  '_' + fname_base
+
+        # Create curves, without linking them to the scene yet
+        tck_objs = []
+        for i in range(num_tck):
+            tck_name = '{}_{:06d}'.format(tck_name_base, i)
+            coords_micron = tck_data[tck_offsets[i]:tck_offsets[i+1]]
 
             # Draw using our simple function
             crv_obj = nmv.geometry.draw_polyline_curve(tck_name, coords_micron,
-                                                        curve_type='POLY')
+                                                        curve_type='POLY',
+                                                        template=tck_template,
+                                                        link=False)
+            tck_objs.append(crv_obj)
             # context.scene.objects.active = crv_obj
             # bpy.ops.object.material_slot_add()
-            set_streamline_appearance(crv_obj, material=tck_mat, solid=True, 
-                caps=True, bevel_object=bev_obj)
 
             # Alternative: line_ops.draw_poly_line
             # crv_obj = nmv.geometry.ops.draw_poly_line(
@@ -471,10 +897,20 @@ class ImportStreamlines(bpy.types.Operator):
             tck_group.objects.link(crv_obj)
             crv_obj[NMV_PROP.OBJECT_TYPE] = NMV_TYPE.STREAMLINE
 
-        # Save references to objects
-        _tck_groups[tck_group.name] = tck_group
+        bpy.data.curves.remove(tck_template)
+
+        # Link all curves at once so the scene is only updated once
+        scene_objects = context.scene.objects
+        for crv_obj in tck_objs:
+            scene_objects.link(crv_obj)
+            crv_obj.select = True
+        if tck_objs:
+            scene_objects.active = tck_objs[-1]
+        context.scene.update()
+
+        invalidate_streamline_index()
         self.report({'INFO'}, 'Loaded {} streamlines into group {}'.format(
-                    len(streamlines), tck_group.name))
+                    num_tck, tck_group.name))
         return {'FINISHED'}
 
 
@@ -501,10 +937,7 @@ class AddROI(bpy.types.Operator):
         sel_obj = context.scene.objects.active
         sel_obj.name = context.scene.RoiName
 
-        group = bpy.data.groups.get(GROUPNAME_ROI_VOLUMES, None)
-        if group is None:
-            group = bpy.data.groups.new(GROUPNAME_ROI_VOLUMES)
-        group.objects.link(sel_obj)
+        _get_or_create_group(GROUPNAME_ROI_VOLUMES).objects.link(sel_obj)
 
         return {'FINISHED'}
 
@@ -578,12 +1011,17 @@ class AttachAxonToNeuron(bpy.types.Operator):
         # Get axon sample points
         # axon_pts = get_curve_point_coordinates(axon_obj)
         spl = axon_obj.data.splines[0]
-        axon_ends = [
-            (axon_obj.matrix_world * spl.points[i].co).to_3d() for i in (0, -1)
-        ]
+        axon_xform = axon_obj.matrix_world
+        p0, p1 = [(axon_xform * spl.points[i].co).to_3d() for i in (0, -1)]
+
+        # Operator options are fixed for the duration of execute()
+        copy_axon = self.copy_axon
+        select_stub = self.select_stub
+        associate_neuron = self.associate_neuron
+        scene_objects = bpy.context.scene.objects
 
         # Check preconditions
-        if not self.copy_axon and len(neuron_objects) > 1:
+        if not copy_axon and len(neuron_objects) > 1:
             self.report({'ERROR'},
                 "Select option 'copy_axon' when using multiple target neurons")
             return {'CANCELLED'}
@@ -591,11 +1029,11 @@ class AttachAxonToNeuron(bpy.types.Operator):
         for neuron_obj in neuron_objects:
         
             # Get point of attachment
-            if self.select_stub:
+            if select_stub:
                 # Stub itself was selected -> get last point
                 stub_obj = neuron_obj
                 stub_pts = get_curve_point_coordinates(stub_obj)
-                attachment_pt = stub_pts[-1] # assume it's last point
+                attachment_pt = mathutils.Vector(stub_pts[-1]) # assume it's last point
             else:
                 # Any cell geometry selected -> get axon or soma point
                 neuron = circuit_data.get_neuron_from_blend_object(neuron_obj)
@@ -606,27 +1044,24 @@ class AttachAxonToNeuron(bpy.types.Operator):
             
             
             # Translate closest end of axon to attachment point
-            p0 = mathutils.Vector(axon_ends[0])
-            p1 = mathutils.Vector(axon_ends[-1])
             d0 = attachment_pt - p0
             d1 = attachment_pt - p1
-            if d0.length < d1.length:
+            if d0.length_squared < d1.length_squared:
                 translation = d0
             else:
                 translation = d1
 
             # Copy axon curve before translation if requested
-            if self.copy_axon:
+            if copy_axon:
                 # Copy the axon
                 new_obj = axon_obj.copy()
                 new_obj.data = axon_obj.data.copy()
                 new_obj.animation_data_clear()
-                bpy.context.scene.objects.link(new_obj)
+                scene_objects.link(new_obj)
 
                 # Add to group
-                for group in bpy.data.groups:
-                    if axon_obj.name in group.objects.keys():
-                        group.objects.link(new_obj)
+                for group in axon_obj.users_group:
+                    group.objects.link(new_obj)
                 target_obj = new_obj
             else:
                 target_obj = axon_obj
@@ -638,7 +1073,7 @@ class AttachAxonToNeuron(bpy.types.Operator):
             # axon_obj.matrix_world = xform
 
             # Set pre-synaptic cell GID
-            if self.associate_neuron:
+            if associate_neuron:
                 target_obj[NMV_PROP.AX_PRE_GID] = neuron_obj.get(NMV_PROP.CELL_GID, None)
                 target_obj[NMV_PROP.AX_PRE_NAME] = neuron_obj.name
 
@@ -681,21 +1116,25 @@ class ToggleAxonExport(bpy.types.Operator):
             return {'FINISHED'}
 
         # Toggle the export flag for each axon
-        mat_exclude = nmvif.ui.tracks_panel.get_streamline_material(state='DEFAULT')
-        mat_include = nmvif.ui.tracks_panel.get_streamline_material(state='INCLUDE_EXPORT')
+        mat_exclude = get_streamline_material(state='DEFAULT')
+        mat_include = get_streamline_material(state='INCLUDE_EXPORT')
+        toggle, export = self.toggle, self.export
+        change_material = self.change_material
         for curve in crv_objs:
-            should_export = curve.get(_PROP_AX_EXPORT, False)
-            if self.toggle:
-                should_export = not should_export
+            if toggle:
+                should_export = not curve.get(_PROP_AX_EXPORT, False)
             else:
-                should_export = self.export
+                should_export = export
             curve[_PROP_AX_EXPORT] = should_export
 
             # Adjust material property to reflect inclusion
-            if self.change_material:
+            if change_material:
                 material = mat_include if should_export else mat_exclude # we flipped it!
-                curve.data.materials.clear()
-                curve.data.materials.append(material)
+                materials = curve.data.materials
+                if len(materials) == 0:
+                    materials.append(material)
+                else:
+                    materials[0] = material
 
 
         return {'FINISHED'}
@@ -724,13 +1163,11 @@ class ExportStreamlines(bpy.types.Operator):
             'FINISHED'
         """
         # Just export raw streamlines, metadata should be in config file
-        streamlines = circuit_data.get_geometries_of_type(
-                        NMV_TYPE.STREAMLINE,
-                        context.scene.objects,
-                        selector=lambda crv: crv.get(_PROP_AX_EXPORT, False))
-        tck_dict = {
-            crv.name: get_curve_point_coordinates(crv, coord_type=list) for crv in streamlines
-        }
+        scene_objects = context.scene.objects
+        streamlines = [crv for crv in get_streamlines(selector='INCLUDE_EXPORT')
+                        if crv.name in scene_objects]
+        tck_names = np.array([crv.name for crv in streamlines])
+        tck_data, tck_offsets = concatenate_curve_coordinates(streamlines)
 
         # Subdirectories for outputs are defined on io_panel.py
         out_basedir = context.scene.OutputDirectory
@@ -738,10 +1175,10 @@ class ExportStreamlines(bpy.types.Operator):
         if not nmv.file.ops.path_exists(out_fulldir):
             nmv.file.ops.clean_and_create_directory(out_fulldir)
 
-        # save as pickle to selected path
-        out_fpath = os.path.join(out_fulldir, 'axon_coordinates.pkl')
-        with open(out_fpath, "wb") as f:
-            pickle.dump(tck_dict, f, protocol=2) # python2-compatible serialization
+        # save as concatenated arrays to selected path,
+        # streamline i is data[offsets[i]:offsets[i+1]]
+        out_fpath = os.path.join(out_fulldir, 'axon_coordinates.npz')
+        np.savez(out_fpath, data=tck_data, offsets=tck_offsets, names=tck_names)
 
         self.report({'INFO'}, 'Wrote axons to file {}'.format(out_fpath))
         return {'FINISHED'}
@@ -770,19 +1207,31 @@ class SplineToPolyline(bpy.types.Operator):
         spacing = context.scene.get('SampleSpacing', self.spacing)
         curve_obj = None
         for obj in context.selected_objects:
-            if obj.type == 'CURVE':
+            if obj.type != 'CURVE':
+                continue
+            spl = obj.data.splines[0]
+            if spl.type == 'POLY':
+                # Polylines can be resampled directly from their local vertices
+                co_buf = np.empty(len(spl.points) * 4, dtype=np.float32)
+                spl.points.foreach_get('co', co_buf)
+                samples = _resample_polyline(
+                            co_buf.reshape((-1, 4))[:, :3], spacing)
+                curve_obj = nmv_curve.draw_polyline_curve(
+                            obj.name + '_POLY', samples)
+
+                # Same coordinate system as original curve. The new origin
+                # is at the center of the samples in local coordinates.
+                curve_obj.matrix_world = obj.matrix_world * \
+                    mathutils.Matrix.Translation(curve_obj.location)
+            else:
                 curve_obj = nmv_curve.spline_to_polyline(obj, spacing=spacing)
 
-                # Set appearance
-                curve_obj.data.bevel_object = obj.data.bevel_object
-                curve_obj.data.use_fill_caps = obj.data.use_fill_caps
-                curve_obj.data.materials.append(obj.data.materials[0])
+            # Set appearance
+            copy_curve_appearance(obj.data, curve_obj.data)
 
-                # Add to group
-                for group in bpy.data.groups:
-                    if obj.name in group.objects.keys():
-                        group.objects.link(curve_obj)
-                
+            # Add to group
+            for group in obj.users_group:
+                group.objects.link(curve_obj)
 
         # Make curve only selected object
         context.scene.objects.active = curve_obj
@@ -824,19 +1273,17 @@ class PolylineToSpline(bpy.types.Operator):
                 curve_obj[NMV_PROP.OBJECT_TYPE] = NMV_TYPE.STREAMLINE
 
                 # Set appearance
-                curve_obj.data.bevel_object = obj.data.bevel_object
-                curve_obj.data.use_fill_caps = obj.data.use_fill_caps
-                curve_obj.data.materials.append(obj.data.materials[0])
+                copy_curve_appearance(obj.data, curve_obj.data)
 
                 # Add to group
-                for group in bpy.data.groups:
-                    if obj.name in group.objects.keys():
-                        group.objects.link(curve_obj)
+                for group in obj.users_group:
+                    group.objects.link(curve_obj)
 
                 
 
         # Make curve only selected object
         if curve_obj:
+            invalidate_streamline_index()
             for scene_object in context.scene.objects:
                 scene_object.select = False
             curve_obj.select = True
@@ -887,6 +1334,59 @@ class OriginToCurveEnd(bpy.types.Operator):
 ################################################################################
 
 
+# Streamlines file
+debug_tck_file = '/home/luye/Documents/mri_data/Waxholm_rat_brain_atlas/WHS_DTI_v1_ALS/S56280_track_filter-ROI-STN.tck'
+default_tck_file = debug_tck_file if DEBUG else 'Select File'
+
+# Scene properties for UI state, registered with the panel
+_scene_properties = [
+    ('StreamlinesFile', StringProperty(
+        name="Streamlines File",
+        description="Select streamlines file",
+        default=default_tck_file, maxlen=2048,  subtype='FILE_PATH')),
+
+    ('StreamlinesLabel', StringProperty(
+        name="Label",
+        description="Enter label for streamlines in file (supported by pickle files)",
+        default='')),
+
+    # ISSUE when loading numpy data saved using Python 2.x -> encoding must be 'latin1'
+    ('StreamlinesEncoding', StringProperty(
+        name="Encoding",
+        description="Encoding of streamlines if using Python pickle file.",
+        default='latin1')),
+
+    ('MaxLoadStreamlines', IntProperty(
+        name="Max Streamlines",
+        description="Maximum number of loaded streamlines",
+        default=100, min=1, max=MAX_LOAD_STREAMLINES)),
+
+    ('MinStreamlineLength', FloatProperty(
+        name="Min Length",
+        description="Minimum streamline length (mm)",
+        default=1.0, min=1.0, max=1e6)),
+
+    ('StreamlineUnitScale', FloatProperty(
+        name="Scale",
+        description="Streamline scale relative to microns (units/um)",
+        default=1e3, min=1e-12, max=1e12)),
+
+    ('RoiName', StringProperty(
+        name="ROI Name",
+        description="Name for selected ROI volume",
+        default='ROI-1')),
+
+    ('SampleSpacing', FloatProperty(
+        name="Spacing",
+        description="Spacing between streamline samples.",
+        default=100.0)),
+
+    ('SubsampleFactor', IntProperty(
+        name="Subsample factor",
+        description="Subsample factor",
+        default=1)),
+]
+
 # Classes to register with Blender
 _reg_classes = [
     StreamlinesPanel, ImportStreamlines, ExportStreamlines, AddROI, ScaleROI,
@@ -899,13 +1399,31 @@ def register_panel():
     """
     Registers all the classes in this panel.
     """
+    for prop_name, prop in _scene_properties:
+        setattr(bpy.types.Scene, prop_name, prop)
+
     for cls in _reg_classes:
         bpy.utils.register_class(cls)
 
+    bpy.app.handlers.scene_update_post.append(_update_streamline_index)
+    bpy.app.handlers.load_post.append(_reset_streamline_index)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post,
+                     bpy.app.handlers.redo_post):
+        handlers.append(_clear_bevel_cache)
+
 
 def unregister_panel():
     """
     Un-registers all the classes in this panel.
     """
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post,
+                     bpy.app.handlers.redo_post):
+        handlers.remove(_clear_bevel_cache)
+    bpy.app.handlers.load_post.remove(_reset_streamline_index)
+    bpy.app.handlers.scene_update_post.remove(_update_streamline_index)
+
     for cls in _reg_classes:
         bpy.utils.unregister_class(cls)
+
+    for prop_name, _ in reversed(_scene_properties):
+        delattr(bpy.types.Scene, prop_name)
@@ -15,6 +15,9 @@
 # If not, see <http://www.gnu.org/licenses/>.
 ####################################################################################################
 
+# System imports
+import sys
+
 # Internal imports
 import neuromorphovis as nmv
 import neuromorphovis.options
@@ -58,9 +61,12 @@ def mkprop(property_name, dtype):
     """
     Make custom property name that is easily identifiable
     as a reserved NeuroMorphoVis property.
+
+    The name is interned, so dict lookups keyed on it can short-circuit
+    on identity.
     """
     global nmv_reserved_property_names
-    prop_name = CUSTOM_PROPERTY_PREFIX + property_name
+    prop_name = sys.intern(CUSTOM_PROPERTY_PREFIX + property_name)
     nmv_reserved_property_names[prop_name] = {'dtype': dtype}
     return prop_name
 
@@ -71,7 +77,7 @@ class NmvPropertyNames:
     OBJECT_TYPE = mkprop('object_type', str)
 
     # Neurons
-    SWC_SAMPLES = mkprop('swc_samples', list)
+    SWC_SAMPLES = mkprop('swc_samples', bytes)
     SWC_STRUCTURE_ID = mkprop('swc_structure_id', int)
     CELL_LABEL = mkprop('cell_label', str)
     CELL_GID = mkprop('cell_gid', int)
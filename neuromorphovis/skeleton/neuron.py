@@ -6,27 +6,45 @@ provided by NeuroMorphoVis.
 
 @author     Lucas Koelman
 """
-import operator
+import itertools
+from collections import deque
 
 import numpy as np
 import mathutils
 
-import neuromorphovis as nmv
+from neuromorphovis.file.ops import get_file_name_from_path
+from neuromorphovis.file.readers import SWCReader
+from neuromorphovis.builders import SkeletonBuilder
+from neuromorphovis.options import NeuroMorphoVisOptions
 from neuromorphovis.interface.ui import ui_data
 from neuromorphovis.interface.ui.ui_data import NMV_PROP, SWC_SAMPLE, NMV_TYPE
 from neuromorphovis.scene.ops import scene_ops
 
 # For assigning new GIDs to morphologies
-gid_counter = 0
+_gid_counter = itertools.count()
 
 def make_gid():
     """
     Make global identifier for cell.
     """
-    global gid_counter
-    gid_count = gid_counter
-    gid_counter += 1
-    return gid_count
+    return next(_gid_counter)
+
+
+# Shared default drawing options, created on first use
+_default_draw_options = None
+
+def get_default_draw_options():
+    """
+    Get default options for drawing neuron morphologies.
+
+    The same object is returned on each call. SkeletonBuilder only reads
+    its options, so it can be shared between neurons.
+    """
+    global _default_draw_options
+    if _default_draw_options is None:
+        _default_draw_options = NeuroMorphoVisOptions()
+        _default_draw_options.morphology.set_default()
+    return _default_draw_options
 
 
 class Neuron(object):
@@ -37,6 +55,10 @@ class Neuron(object):
     for manipulation in Blender. The class keeps track of its geometrical
     entities in Blender and any transformations applied to it.
     """
+    # Fixed attribute set, avoids a per-instance __dict__
+    __slots__ = ('gid', 'label', 'morphology', 'swc_samples', 'geometry',
+                 '_geometry_by_type', '_out',
+                 '_last_xform', '_last_xform_T')
 
     def __init__(self,
                  label=None,
@@ -51,7 +73,7 @@ class Neuron(object):
         :param swc_samples:
             iterable(indexable) : List of samples, see SWC file specification.
         """
-        if swc_file and swc_samples:
+        if swc_file and swc_samples is not None:
             raise ValueError("Provide either SWC file or samples but not both.")
 
         # Morphology GID
@@ -60,7 +82,7 @@ class Neuron(object):
         # Morphology label (will be morphology name or gid)
         if label is None:
             if swc_file:
-                label_prefix = nmv.file.ops.get_file_name_from_path(swc_file)
+                label_prefix = get_file_name_from_path(swc_file)
             else:
                 label_prefix = 'neuron'
             self.label = label_prefix + '.GID-{}'.format(self.gid)
@@ -69,26 +91,30 @@ class Neuron(object):
 
         # Default state
         self.geometry = None
+        self._geometry_by_type = {}
         self.morphology = None
+        self.swc_samples = None # (N x 7) float32 array
+        self._out = None
+        self._last_xform = None
+        self._last_xform_T = None
 
         # Samples are given, so we create the geometry
-        if swc_file or swc_samples:
-            reader =  nmv.file.readers.SWCReader(swc_file=swc_file)
+        if swc_file or swc_samples is not None:
+            reader =  SWCReader(swc_file=swc_file)
             if swc_file:
                 reader.read_samples()
-            elif swc_samples:
+            elif swc_samples is not None:
                 reader.set_samples(swc_samples)
 
             self.morphology = reader.build_morphology(
                                 label=self.label, gid=self.gid)
-            self.swc_samples = reader.get_samples()
+            self._set_samples(reader.get_samples())
 
             if draw_geometry:
                 # Draw morphology skeleton and store list of reconstructed objects
                 if draw_options is None:
-                    draw_options = nmv.options.NeuroMorphoVisOptions()
-                    draw_options.morphology.set_default()
-                builder = nmv.builders.SkeletonBuilder(
+                    draw_options = get_default_draw_options()
+                builder = SkeletonBuilder(
                                     self.morphology, draw_options)
                 self.geometry = builder.draw_morphology_skeleton(
                                     parent_to_soma=True, group_geometry=False)
@@ -96,42 +122,67 @@ class Neuron(object):
         if parent_geometry is not None:
             # Get SWC samples saved on parent geometry
             samples = parent_geometry.get(NMV_PROP.SWC_SAMPLES, None)
-            if samples is not None:
-                self.swc_samples = samples
+            if isinstance(samples, bytes):
+                # Copy, since arrays sharing memory with bytes are read-only
+                self._set_samples(np.frombuffer(
+                    samples, dtype=np.float32).reshape((-1, 7)).copy())
+            elif samples is not None: # nested list in older blend files
+                self._set_samples(samples)
 
             # Add all child objects to neuron geometry
             self.geometry = []
-            children = [parent_geometry]
-            while len(children) > 0:
-                child = children.pop()
+            children = deque((parent_geometry,))
+            while children:
+                child = children.popleft()
                 self.geometry.append(child)
                 children.extend(child.children)
 
         # Save morphology name and gid on each geometry
         if self.geometry:
+            prop_label, prop_gid = NMV_PROP.CELL_LABEL, NMV_PROP.CELL_GID
+            prop_type, geom_type = NMV_PROP.OBJECT_TYPE, NMV_TYPE.NEURON_GEOMETRY
+            label, gid = self.label, self.gid
+            prop_swc_type = NMV_PROP.SWC_STRUCTURE_ID
             for bobj in self.geometry:
-                bobj[NMV_PROP.CELL_LABEL] = self.label
-                bobj[NMV_PROP.CELL_GID] = self.gid
-                bobj[NMV_PROP.OBJECT_TYPE] = NMV_TYPE.NEURON_GEOMETRY
+                bobj[prop_label] = label
+                bobj[prop_gid] = gid
+                bobj[prop_type] = geom_type
+
+                # Index geometry by SWC type to avoid rescanning it later
+                self._geometry_by_type.setdefault(
+                    bobj.get(prop_swc_type, None), []).append(bobj)
 
             # Save neuron data on Blend geometry
             self.serialize_to_blend()
 
 
+    def _set_samples(self, swc_samples):
+        """
+        Set the SWC samples and the buffer used to transform them.
+
+        The samples are converted once to an (N x 7) float32 array.
+
+        :param swc_samples:
+            iterable(indexable) : List of samples, see SWC file specification.
+        """
+        self.swc_samples = np.ascontiguousarray(swc_samples, dtype=np.float32)
+        self._out = np.empty((len(self.swc_samples), 3), dtype=np.float32)
+
+
     def duplicate(self, label):
         # Get soma and neuron geometry
         soma_geometry = self.get_soma_geometry()
-        neurite_geometry = [bobj for bobj in self.geometry if 
-                            bobj.get(NMV_PROP.SWC_STRUCTURE_ID, None) != SWC_SAMPLE.SOMA]
+        neurite_geometry = self.get_geometry(swc_type=SWC_SAMPLE.SOMA,
+                                             exclude_type=True)
 
         # Duplicate the geometry
         soma_copy = scene_ops.duplicate_simple(soma_geometry)
-        geometry_copy = [soma_copy]
-        
-        for bobj in neurite_geometry:
+        geometry_copy = [soma_copy] + [None] * len(neurite_geometry)
+
+        for i, bobj in enumerate(neurite_geometry, 1):
             new_geom = scene_ops.duplicate_simple(bobj)
             new_geom.parent = soma_copy
-            geometry_copy.append(new_geom)
+            geometry_copy[i] = new_geom
 
         # Uses the copied geometry to query samples, creates new GID
         neuron_copy = Neuron(label, parent_geometry=soma_copy)
@@ -140,7 +191,7 @@ class Neuron(object):
 
 
     def get_soma_geometry(self):
-        geom_objs = self.get_geometry(swc_type=SWC_SAMPLE.SOMA)
+        geom_objs = self._geometry_by_type.get(SWC_SAMPLE.SOMA, ())
         if len(geom_objs) > 1:
             raise Exception("More than one soma geometry.")
         elif len(geom_objs) < 1:
@@ -158,11 +209,12 @@ class Neuron(object):
         if swc_type is None:
             return self.geometry
         elif exclude_type:
-            compare = operator.ne
+            return list(itertools.chain.from_iterable(
+                        geom_objs for geom_type, geom_objs
+                        in self._geometry_by_type.items()
+                        if geom_type != swc_type))
         else:
-            compare = operator.eq
-        return [bobj for bobj in self.geometry if compare(swc_type,
-                    bobj.get(NMV_PROP.SWC_STRUCTURE_ID, None))]
+            return list(self._geometry_by_type.get(swc_type, ()))
 
 
     def get_transform(self):
@@ -173,10 +225,13 @@ class Neuron(object):
     def serialize_to_blend(self):
         """
         Serialize persistent data to blend file for later restore.
+
+        SWC samples are stored as the raw bytes of the float32 sample
+        array rather than as nested lists.
         """
-        if self.geometry is not None:
+        if self.geometry is not None and self.swc_samples is not None:
             soma_bobj = self.get_soma_geometry()
-            soma_bobj[NMV_PROP.SWC_SAMPLES] = self.swc_samples
+            soma_bobj[NMV_PROP.SWC_SAMPLES] = self.swc_samples.tobytes()
 
 
     def get_transformed_samples(self):
@@ -186,14 +241,21 @@ class Neuron(object):
         :return samples:
             Transformed samples as Nx7 numpy array
         """
+        # matrix_world returns a new wrapper on each access, so compare
+        # values to decide whether the transposed matrix must be rebuilt
         xform = self.get_transform()
-        xform_matrix = np.array(xform) # 4x4 array
-
-        sample_matrix = np.array(self.swc_samples)
-        coord_matrix = sample_matrix[:, 2:6] # x, y, z, radius
-        coord_matrix[:, 3] = 1.0 # for application of 4x4 transform
-
-        coords_transformed = np.dot(coord_matrix, xform_matrix.T)
-        sample_matrix[:, 2:5] = coords_transformed[:, 0:3]
+        if self._last_xform is None or xform != self._last_xform:
+            self._last_xform = xform.copy()
+            self._last_xform_T = np.ascontiguousarray(
+                                    np.array(xform, dtype=np.float32).T)
+        xform_T = self._last_xform_T
+
+        # Apply linear part and translation to x, y, z directly rather than
+        # padding coordinates to homogeneous form
+        np.dot(self.swc_samples[:, 2:5], xform_T[:3, :3], out=self._out)
+        self._out += xform_T[3, :3]
+
+        sample_matrix = self.swc_samples.copy()
+        sample_matrix[:, 2:5] = self._out
 
         return sample_matrix
\ No newline at end of file
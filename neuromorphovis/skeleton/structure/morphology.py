@@ -17,9 +17,13 @@
 
 # System imports
 import copy
+import math
+
+# External imports
+import numpy as np
 
 # Blender imports
-from mathutils import Matrix
+from mathutils import Matrix, Vector
 
 # Internal imports
 import neuromorphovis as nmv
@@ -27,6 +31,20 @@ import neuromorphovis.bbox
 import neuromorphovis.skeleton
 
 
+# Separator line between log entries
+LOG_SEPARATOR = '*' * 80
+
+
+def points_to_array(points):
+    """
+    Gather 3D points into the rows of an (N x 3) float32 array.
+
+    :param points:
+        Iterable of mathutils.Vector or other 3-element sequences.
+    """
+    return np.array([point[:] for point in points], dtype=np.float32).reshape((-1, 3))
+
+
 ####################################################################################################
 # Morphology
 ####################################################################################################
@@ -76,14 +94,19 @@ class Morphology:
         # Morphology apical dendrite
         self.apical_dendrite = apical_dendrite
 
-        # A copy of the original axon, needed for comparison
-        self.original_axon = copy.deepcopy(axon)
+        # Snapshots of the original sample points and radii, needed for comparison.
+        # These are (N x 4) arrays of (x, y, z, radius) rather than deep copies of
+        # the section trees.
 
-        # A copy of the original basal dendrites list, needed for comparison
-        self.original_dendrites = copy.deepcopy(dendrites)
+        # The original axon samples
+        self.original_axon = self.snapshot_arbor_samples(axon)
 
-        # A copy of the original apical dendrite, needed for comparison
-        self.origin_apical_dendrite = copy.deepcopy(apical_dendrite)
+        # The original basal dendrites samples, one array per dendrite
+        self.original_dendrites = None if dendrites is None else [
+            self.snapshot_arbor_samples(dendrite) for dendrite in dendrites]
+
+        # The original apical dendrite samples
+        self.origin_apical_dendrite = self.snapshot_arbor_samples(apical_dendrite)
 
         # Morphology GID
         self.gid = gid
@@ -117,51 +140,101 @@ class Morphology:
         :param label:
             label for duplicated morphology
         """
+        clone = lambda arbor: None if arbor is None else arbor.clone_subtree()
         return Morphology(soma=copy.deepcopy(self.soma),
-                    axon=copy.deepcopy(self.axon),
-                    dendrites=copy.deepcopy(self.dendrites),
-                    apical_dendrite=copy.deepcopy(self.apical_dendrite),
+                    axon=clone(self.axon),
+                    dendrites=None if self.dendrites is None else [
+                        clone(dendrite) for dendrite in self.dendrites],
+                    apical_dendrite=clone(self.apical_dendrite),
                     label=label)
 
 
+    def get_arbors(self):
+        """
+        Get the root sections of all arbors in the morphology.
+
+        :return:
+            List of sections: axon, apical dendrite and basal dendrites.
+        """
+        arbors = []
+        if self.has_axon():
+            arbors.append(self.axon)
+        if self.has_apical_dendrite():
+            arbors.append(self.apical_dendrite)
+        if self.has_dendrites():
+            arbors.extend(self.dendrites)
+        return arbors
+
+
+    def collect_samples(self, arbors=None):
+        """
+        Get all samples of all sections in the morphology's arbors.
+
+        :param arbors:
+            Root sections to collect samples from, all arbors if None.
+        :return:
+            List of samples, in depth-first order of their sections.
+        """
+        samples = []
+        stack = self.get_arbors() if arbors is None else list(arbors)
+        while stack:
+            section = stack.pop()
+            samples.extend(section.samples)
+            stack.extend(section.children)
+        return samples
+
+
+    def snapshot_arbor_samples(self, arbor):
+        """
+        Copy the sample points and radii of an arbor into an array.
+
+        :param arbor:
+            Root section of the arbor, or None.
+        :return:
+            (N x 4) float32 array of (x, y, z, radius), or None if the arbor is None.
+        """
+        if arbor is None:
+            return None
+        samples = self.collect_samples(arbors=[arbor])
+        return np.array([sample.point[:] + (sample.radius,) for sample in samples],
+                        dtype=np.float32).reshape((-1, 4))
+
+
     def transform_sample_points(self, matrix):
         """
         Applies 4x4 transformation matrix to each sample point.
 
+        All points of the soma and arbors are gathered into a single array
+        so the transform is applied in one matrix product.
+
         :param matrix:
             mathutils.Matrix (4x4)
         """
-        xform_pt = lambda pt: (matrix * pt.to_4d()).to_3d()
-
-        def transform_subtree(section):
-            # transform all sample points in section
-            for i in range(0, len(section.samples)):
-                new_pt = matrix * section.samples[i].point.to_4d()
-                section.samples[i].point = new_pt.to_3d()
-            # recursively do the same for children
-            for child in section.children:
-                transform_subtree(child)
-
-        # Transform soma
-        self.soma.centroid = xform_pt(self.soma.centroid)
-        self.soma.profile_points = [
-            xform_pt(pt) for pt in self.soma.profile_points]
-        if self.soma.arbors_profile_points is not None:
-            self.soma.arbors_profile_points = [
-                xform_pt(pt) for pt in self.soma.arbors_profile_points
-            ]
-
-        # Transform axon if exists
-        if self.has_axon():
-            self.transform_subtree(self.axon)
-
-        # Transform apical dendrite if exists
-        if self.has_apical_dendrite():
-            self.transform_subtree(self.apical_dendrite)
-
-        # Transform basal dendrites
-        for basal_dendrite in self.dendrites:
-            transform_subtree(basal_dendrite)
+        samples = self.collect_samples()
+        soma = self.soma
+        soma_points = [soma.centroid] + list(soma.profile_points)
+        arbors_points = soma.arbors_profile_points
+        if arbors_points is None:
+            arbors_points = []
+
+        # Gather all points as rows of an (N x 3) array
+        points = points_to_array([sample.point for sample in samples] +
+                                 soma_points + list(arbors_points))
+
+        # Apply the affine transform to all points at once
+        xform = np.array(matrix, dtype=np.float32)
+        points = points.dot(xform[:3, :3].T)
+        points += xform[:3, 3]
+        points = [Vector(row) for row in points.tolist()]
+
+        # Scatter transformed points back
+        num_samples = len(samples)
+        for sample, point in zip(samples, points):
+            sample.point = point
+        soma.centroid = points[num_samples]
+        soma.profile_points = points[num_samples+1:num_samples+len(soma_points)]
+        if soma.arbors_profile_points is not None:
+            soma.arbors_profile_points = points[num_samples+len(soma_points):]
 
         # Save new transformation matrix
         self.matrix_world = matrix * self.matrix_world
@@ -184,11 +257,10 @@ class Morphology:
             return None
 
         terminal_section = self.axon
-        while len(terminal_section.children) > 0:
+        while terminal_section.children:
             terminal_section = terminal_section.children[0]
 
-        num_pt = len(terminal_section.samples)
-        return terminal_section.samples[num_pt-1]
+        return terminal_section.samples[-1]
 
 
     def has_dendrites(self):
@@ -197,11 +269,7 @@ class Morphology:
 
         :return: True or False.
         """
-
-        if self.dendrites is None:
-            return False
-
-        return True
+        return (self.dendrites is not None)
 
 
     def has_apical_dendrite(self):
@@ -210,11 +278,7 @@ class Morphology:
 
         :return: True or False.
         """
-
-        if self.apical_dendrite is None:
-            return False
-
-        return True
+        return (self.apical_dendrite is not None)
 
     ################################################################################################
     # @compute_bounding_box
@@ -224,49 +288,16 @@ class Morphology:
         Computes the bounding box of the morphology
         """
 
-        # Compute the bounding box
-        axon_bounding_box = None
-        if self.has_axon():
-            axon_bounding_box = nmv.skeleton.ops.compute_arbor_bounding_box(self.axon)
-
-        # Compute basal dendrites bounding boxes
-        basal_dendrites_bounding_boxes = []
-        if self.dendrites is not None:
-            for dendrite in self.dendrites:
-                basal_dendrite_bounding_box = nmv.skeleton.ops.compute_arbor_bounding_box(dendrite)
-                basal_dendrites_bounding_boxes.append(basal_dendrite_bounding_box)
-
-        # Compute apical dendrite bounding box
-        apical_dendrite_bounding_box = None
-        if self.has_apical_dendrite():
-            apical_dendrite_bounding_box = nmv.skeleton.ops.compute_arbor_bounding_box(
-                self.apical_dendrite)
-
-        # Get the joint bounding box of the entire morphology by collecting the individual ones in a
-        # list and then merging the list into a single bounding box
-        morphology_bounding_boxes = basal_dendrites_bounding_boxes
-
-        # If the axon is there, add it
-        if axon_bounding_box is not None:
-            morphology_bounding_boxes.append(axon_bounding_box)
-
-        # If the apical dendrite is there, add it
-        if apical_dendrite_bounding_box is not None:
-            morphology_bounding_boxes.append(apical_dendrite_bounding_box)
-
-        # Get the joint bounding box from the list
-        morphology_bounding_box = nmv.bbox.extend_bounding_boxes(morphology_bounding_boxes)
-
-        # Extend the bounding box a little to verify the results
-        morphology_bounding_box.p_min[0] -= 5
-        morphology_bounding_box.p_min[1] -= 5
-        morphology_bounding_box.p_min[2] -= 5
-        morphology_bounding_box.p_max[0] += 5
-        morphology_bounding_box.p_max[1] += 5
-        morphology_bounding_box.p_max[2] += 5
-        morphology_bounding_box.bounds[0] += 10
-        morphology_bounding_box.bounds[1] += 10
-        morphology_bounding_box.bounds[2] += 10
+        # Reduce over the flat array of all sample points at once (radii are not needed)
+        points = points_to_array(sample.point for sample in self.collect_samples())
+        if len(points) == 0:
+            morphology_bounding_box = nmv.bbox.extend_bounding_boxes([])
+        else:
+            # Extend the bounding box a little to verify the results
+            p_min = points.min(axis=0) - 5
+            p_max = points.max(axis=0) + 5
+            morphology_bounding_box = nmv.bbox.BoundingBox(
+                p_min=Vector(p_min.tolist()), p_max=Vector(p_max.tolist()))
 
         # Save the morphology bounding box
         self.bounding_box = morphology_bounding_box
@@ -285,7 +316,7 @@ class Morphology:
         """
 
         # Count the first section samples
-        nmv.logger.log('********************************************************************************')
+        nmv.logger.log(LOG_SEPARATOR)
         nmv.logger.log('Section:[%s, %s] '
               '\n\t* Number samples:[%d] '
               '\n\t* Length:[%f um]'
@@ -305,10 +336,13 @@ class Morphology:
                   (arbor.get_type_string(), str(arbor.id)))
 
         # Get the distance between the center and the first sample on the arbor
-        first_sample_distance = arbor.samples[0].point.length
+        # NOTE: Squared distances are compared to avoid a square root per sample
+        first_sample_distance_squared = arbor.samples[0].point.length_squared
 
         # If the first sample is relatively far away, then connect it back to the soma
-        if first_sample_distance > 20:
+        if first_sample_distance_squared > 20 ** 2:
+            first_sample_distance = math.sqrt(first_sample_distance_squared)
+
             # Report the issue
             nmv.logger.log('MORPHOLOGY ERROR: The first sample of [%s: %s] is far away [%f] from the soma!' %
                   (arbor.get_type_string(), str(arbor.id), first_sample_distance))
@@ -321,45 +355,37 @@ class Morphology:
             __first_sample_distance__ = 17.5
             arbor.samples[0].point = __first_sample_distance__ * first_sample_direction
 
-        # Remove the negative samples
-        for i, sample in enumerate(arbor.samples):
-
-            # Do not compare the first sample with itself
-            if i == 0:
-                continue
+        # Remove the negative samples in a single pass, keeping at least two samples
+        num_samples = len(arbor.samples)
+        kept_samples = [arbor.samples[0]]
+        for i, sample in enumerate(arbor.samples[1:], 1):
 
             # Compare the location of the sample to that of the first sample
-            if sample.point.length < first_sample_distance:
-
-                # Report the issue
-                nmv.logger.log('MORPHOLOGY ERROR: Negative sample [%d]!' % i)
-
-                # Verify the length of the list
-                if len(arbor.samples) > 2:
+            if sample.point.length_squared >= first_sample_distance_squared:
+                kept_samples.append(sample)
+                continue
 
-                    nmv.logger.log('MORPHOLOGY FIX: Removing a negative sample [%s]' % str(sample.id))
-                    arbor.samples.remove(sample)
+            # Report the issue
+            nmv.logger.log('MORPHOLOGY ERROR: Negative sample [%d]!' % i)
 
-                # If the section has one sample, then the code should not reach this point
-                elif len(arbor.samples) == 1:
-                    nmv.logger.log(
-                    'MORPHOLOGY SEVERE ERROR: Cannot remove a single sampled section, EXITING!')
-                    exit(0)
+            # Verify the length of the list
+            if num_samples > 2:
+                nmv.logger.log('MORPHOLOGY FIX: Removing a negative sample [%s]' % str(sample.id))
+                num_samples -= 1
 
-                # If the section has only two samples, and the second one is negative, then we must
-                # replace the first sample position to a convenient place
-                elif len(arbor.samples) == 2:
-                    nmv.logger.log('MORPHOLOGY FIX: Changing the position of the first sample.')
+            # If the section has only two samples, and the second one is negative, then we must
+            # replace the first sample position to a convenient place
+            else:
+                nmv.logger.log('MORPHOLOGY FIX: Changing the position of the first sample.')
 
-                    # TODO: Add the __sample_shift_value__ to the constants
-                    __sample_shift_value__ = 0.5
-                    direction = (arbor.samples[0].point - arbor.samples[1].point).normalized()
-                    arbor.samples[0].point = arbor.samples[
-                                                 1].point - direction * __sample_shift_value__
+                # TODO: Add the __sample_shift_value__ to the constants
+                __sample_shift_value__ = 0.5
+                first_sample = kept_samples[0]
+                direction = (first_sample.point - sample.point).normalized()
+                first_sample.point = sample.point - direction * __sample_shift_value__
+                kept_samples.append(sample)
 
-                else:
-                    nmv.logger.log('MORPHOLOGY SEVERE ERROR: Unreported case, EXITING!')
-                    exit(0)
+        arbor.samples = kept_samples
 
     ################################################################################################
     # @fix_arbor
@@ -387,17 +413,9 @@ class Morphology:
         Fixes the artifacts of the morphology, if there are any artifacts.
         """
 
-        # Fix the axon if exists
-        if self.has_axon():
-            self.fix_arbor(self.axon)
-
-        # Fix the apical dendrite if exists
-        if self.has_apical_dendrite():
-            self.fix_arbor(self.apical_dendrite)
-
-        # Fix the basal dendrites
-        for basal_dendrite in self.dendrites:
-            self.fix_arbor(basal_dendrite)
+        # Fix the axon, apical dendrite and basal dendrites that exist
+        for arbor in self.get_arbors():
+            self.fix_arbor(arbor)
 
     ################################################################################################
     # @set_section_branching_order
@@ -405,20 +423,25 @@ class Morphology:
     def set_section_branching_order(self,
                                     section,
                                     order=1):
-        """Sets the branching order of the section and its children recursively.
+        """Sets the branching order of the section and its children.
+
+        The tree is walked iteratively, so deep arbors do not hit the
+        recursion limit.
 
         :param section:
             A given section.
         :param order:
             Section branching order.
         """
+        stack = [(section, order)]
+        while stack:
+            section, order = stack.pop()
 
-        # Set the branching order of the section
-        section.branching_order = order
+            # Set the branching order of the section
+            section.branching_order = order
 
-        # Set the branching order of the children
-        for child in section.children:
-            self.set_section_branching_order(section=child, order=order + 1)
+            # Set the branching order of the children
+            stack.extend((child, order + 1) for child in section.children)
 
     ################################################################################################
     # @update_branching_order
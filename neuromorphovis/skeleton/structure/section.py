@@ -15,6 +15,9 @@
 # If not, see <http://www.gnu.org/licenses/>.
 ####################################################################################################
 
+# System imports
+import copy
+
 
 ####################################################################################################
 # Section
@@ -258,3 +261,50 @@ class Section:
 
             # Set the sample index according to its order along the section in the samples list
             section_sample.id = i
+
+    ################################################################################################
+    # @clone_subtree
+    ################################################################################################
+    def clone_subtree(self):
+        """Clones the section and all its children sections.
+
+        New section and sample objects are created for the whole subtree and the sample points and
+        soma face centroids are copied. The mesh of a cloned section is reset to None, and the
+        remaining attributes are shallow copies. This is much faster than copy.deepcopy() since a
+        section tree has no cycles or shared nodes.
+
+        :return:
+            The cloned section.
+        """
+
+        root_copy = None
+        stack = [(self, None)]
+        while stack:
+            section, parent_copy = stack.pop()
+
+            # Copy the section and its samples
+            section_copy = copy.copy(section)
+            section_copy.children_ids = list(section.children_ids)
+            section_copy.mesh = None
+            if section.soma_face_centroid is not None:
+                section_copy.soma_face_centroid = section.soma_face_centroid.copy()
+            if section.samples is not None:
+                section_copy.samples = list()
+                for sample in section.samples:
+                    sample_copy = copy.copy(sample)
+                    sample_copy.point = sample.point.copy()
+                    sample_copy.section = section_copy
+                    section_copy.samples.append(sample_copy)
+
+            # Link the copy into the cloned tree
+            section_copy.children = list()
+            if parent_copy is None:
+                root_copy = section_copy
+            else:
+                section_copy.parent = parent_copy
+                parent_copy.children.append(section_copy)
+
+            # Children are pushed in reverse to keep their order in the copy
+            stack.extend((child, section_copy) for child in reversed(section.children))
+
+        return root_copy
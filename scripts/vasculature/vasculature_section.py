@@ -15,6 +15,9 @@
 # If not, see <http://www.gnu.org/licenses/>.
 ####################################################################################################
 
+# External imports
+import numpy as np
+
 
 ####################################################################################################
 # VasculatureSection
@@ -51,6 +54,33 @@ class VasculatureSection:
         # Section name
         self.name = 'section_' + str(index)
 
+        # Homogeneous sample points (N x 4) and radii (N), built on first use
+        self.points_array = None
+        self.radii_array = None
+
+    ################################################################################################
+    # @get_sample_arrays
+    ################################################################################################
+    def get_sample_arrays(self):
+        """Gets the sample points and radii of the section as arrays.
+
+        The arrays are built once from the samples list on the first call, so the samples should
+        not be modified afterwards.
+
+        :return:
+            A tuple of the homogeneous sample points (N x 4) and the sample radii (N).
+        """
+
+        if self.points_array is None:
+            number_samples = len(self.samples_list)
+            self.points_array = np.ones((number_samples, 4))
+            self.radii_array = np.empty(number_samples)
+            for i, sample in enumerate(self.samples_list):
+                self.points_array[i, :3] = sample.point[0:3]
+                self.radii_array[i] = sample.radius
+
+        return self.points_array, self.radii_array
+
     ################################################################################################
     # @update_children
     ################################################################################################
@@ -16,6 +16,7 @@
 ####################################################################################################
 
 # Blender imports
+import bpy
 from mathutils import Vector
 
 # NeuroMorphoVis imports
@@ -29,6 +30,9 @@ import neuromorphovis.scene
 import vasculature_sample
 import vasculature_section
 
+# Number of sections drawn and exported between two clears of the scene
+SECTIONS_BATCH_SIZE = 256
+
 
 ####################################################################################################
 # VasculatureSketcher
@@ -44,11 +48,37 @@ class VasculatureSketcher:
         """Constructor.
 
         :param bevel_object:
-            Input bevel object.
+            Input bevel object, or None to create one on first use.
         """
 
         self.bevel_object = bevel_object
 
+    ################################################################################################
+    # @get_bevel_object
+    ################################################################################################
+    def get_bevel_object(self):
+        """Gets the bevel object shared by all the sketched sections.
+
+        The bevel object is created once and re-created only if it was removed from the scene,
+        for example by nmv.scene.clear_scene().
+
+        :return:
+            A reference to the bevel object.
+        """
+
+        try:
+            valid = (self.bevel_object is not None and
+                     self.bevel_object.name in bpy.data.objects)
+        except ReferenceError:
+            # The object was removed from bpy.data
+            valid = False
+
+        if not valid:
+            self.bevel_object = nmv.mesh.create_bezier_circle(
+                radius=1.0, vertices=16, name='bevel')
+
+        return self.bevel_object
+
     ################################################################################################
     # @sketch_section
     ################################################################################################
@@ -62,19 +92,13 @@ class VasculatureSketcher:
             A reference to the section polyline.
         """
 
-        # Construct the poly-line data
-        poly_line_data = list()
-
-        # Append the samples
-        for sample in section.samples_list:
-            poly_line_data.append([(sample.point[0], sample.point[1], sample.point[2], 1),
-                                   sample.radius])
-
-        bevel_object = nmv.mesh.create_bezier_circle(radius=1.0, vertices=16, name='bevel')
+        # Construct the poly-line data from the section sample arrays
+        points, radii = section.get_sample_arrays()
 
         # Draw a polyline
-        section_polyline = nmv.geometry.ops.draw_poly_line(poly_line_data,
-                                                           bevel_object=bevel_object,
+        section_polyline = nmv.geometry.ops.draw_poly_line(points.tolist(),
+                                                           poly_line_radii=radii.tolist(),
+                                                           bevel_object=self.get_bevel_object(),
                                                            name=section.name,
                                                            caps=True)
         return section_polyline
@@ -123,17 +147,18 @@ class VasculatureSketcher:
         start_index = portion * portion_size
         end_index = start_index + portion_size
 
-        # For each section
-        for i in range(start_index, end_index):
+        end_index = min(end_index, len(sections_list))
 
-            if i >= len(sections_list):
-                break
+        # Process the sections in batches, clearing the scene once per batch
+        for batch_start in range(start_index, end_index, SECTIONS_BATCH_SIZE):
+            batch_end = min(batch_start + SECTIONS_BATCH_SIZE, end_index)
 
             # Indication
-            print('%d/%d' % (i, end_index))
+            print('%d/%d' % (batch_start, end_index))
 
             # Clear the scene
             nmv.scene.clear_scene()
 
-            # Draw and save the section
-            self.draw_and_save_section(sections_list[i], output_directory)
+            # Draw and save each section in the batch
+            for i in range(batch_start, batch_end):
+                self.draw_and_save_section(sections_list[i], output_directory)